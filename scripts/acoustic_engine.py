@@ -7,13 +7,20 @@ WAV ファイルから「熱量スパイク」を検出し、秒数と強度を
 使い方:
     python scripts/acoustic_engine.py audio.wav > spikes.json
     python scripts/acoustic_engine.py audio.wav --output spikes.json
+    python scripts/acoustic_engine.py audio.wav --pitch-method pyin
+    python scripts/acoustic_engine.py audio.wav --no-cache
 
 アルゴリズム:
     1. RMS（音量）を hop_length ごとに計算
-    2. pYIN で F0（基本周波数）を推定し、各フレームの標準偏差をピッチ分散として算出
+    2. ピッチ分散を算出（各フレーム前後 ±10 フレームの標準偏差）
+       - centroid（デフォルト）: RMS と同じ STFT から求めたスペクトル重心を使う
+       - pyin: 8kHz にダウンサンプリングした音声から pYIN で F0（基本周波数）を
+         推定して使う（RMS のフレームに補間）
+       - world: pyworld の DIO + StoneMask で F0 を推定して使う（要 pyworld）
     3. heat_index = normalized_rms × (1 + normalized_pitch_var)
     4. 95パーセンタイル超のフレームをスパイク候補とする
     5. 0.5秒以内の隣接スパイクをマージ（最大強度のフレームを代表点にする）
+    ※ RMS が無音・ほぼ一定の場合はピッチ分散を求めずに [] を返す
 
 出力 JSON:
     [{"seconds": 12.3, "intensity": 1.42}, ...]
@@ -21,51 +28,60 @@ WAV ファイルから「熱量スパイク」を検出し、秒数と強度を
 """
 
 import argparse
+import hashlib
 import json
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 import librosa
 import numpy as np
+import soundfile as sf
 
 
 # ─── 定数 ────────────────────────────────────────────────────────────────────
 
 SR              = 22050   # サンプリングレート（librosa デフォルト）
 HOP_LENGTH      = 512     # フレームシフト（約23ms）
+N_FFT           = 2048    # STFT の窓長（約93ms）
 SPIKE_PERCENTILE = 95     # このパーセンタイルを超えたフレームをスパイク候補とする
 MERGE_SECONDS   = 0.5     # この秒数以内の隣接スパイクをマージする
+SILENCE_RMS     = 1e-4    # RMS の最大値がこれ未満なら無音とみなす
+FLAT_RMS_RATIO  = 0.05    # (max - min) / max がこれ未満なら音量変動なしとみなす
 
+# pYIN（--pitch-method pyin）の F0 推定はピッチ分散の目安にしか使わないため、
+# 低いサンプリングレートで行う
+F0_SR           = 8000
+F0_HOP_LENGTH   = HOP_LENGTH * F0_SR // SR   # RMS とほぼ同じ時間間隔（約23ms）
+F0_FRAME_LENGTH = 1024                        # 約128ms
+FMIN_HZ         = librosa.note_to_hz("C2")    # F0 探索範囲の下限（約65Hz）
+FMAX_HZ         = librosa.note_to_hz("C6")    # F0 探索範囲の上限（約1047Hz）
 
-# ─── メイン処理 ───────────────────────────────────────────────────────────────
+# 長い音声の pYIN はチャンクに分けてプロセス並列で実行する
+PYIN_MIN_CHUNK_SECONDS = 30    # 1 チャンクの最短長（これより短い音声は分割しない）
+PYIN_OVERLAP_SECONDS   = 1.0   # チャンク前後ののりしろ
 
-def detect_spikes(wav_path: str) -> list[dict]:
-    """WAV ファイルを解析してスパイクリストを返す。"""
-    y, sr = librosa.load(wav_path, sr=SR, mono=True)
+# 特徴量（RMS・ピッチ分散）のキャッシュ先。キーは WAV の内容と解析パラメータのハッシュ
+CACHE_DIR       = Path(__file__).parent.parent / ".cache" / "acoustic"
 
-    # 1. RMS エネルギー
-    rms = librosa.feature.rms(y=y, hop_length=HOP_LENGTH)[0]
 
-    # 2. F0 推定（pYIN）
-    f0, voiced_flag, _ = librosa.pyin(
-        y,
-        fmin=librosa.note_to_hz("C2"),
-        fmax=librosa.note_to_hz("C7"),
-        sr=sr,
-        hop_length=HOP_LENGTH,
-    )
-    # 無声区間を 0 に置換してピッチ分散を算出（窓幅: ±10フレーム = 約0.23秒）
-    f0_safe = np.where(voiced_flag, f0, 0.0)
-    window  = 10
-    pitch_var = np.array([
-        np.std(f0_safe[max(0, i - window): i + window])
-        for i in range(len(f0_safe))
-    ])
-
-    # フレーム数を rms に揃える
-    min_len   = min(len(rms), len(pitch_var))
-    rms       = rms[:min_len]
-    pitch_var = pitch_var[:min_len]
+# ─── メイン処理 ───────────────────────────────────────────────────────────────
+
+def detect_spikes(
+    wav_path: str,
+    pitch_method: str = "centroid",
+    use_cache: bool = True,
+) -> list[dict]:
+    """WAV ファイルを解析してスパイクリストを返す。
+
+    pitch_method: ピッチ分散の算出方法（"centroid"・"pyin"・"world"）
+    use_cache:    True の場合、特徴量を CACHE_DIR にキャッシュして再利用する
+    """
+    # 1–2. RMS エネルギーとピッチ分散
+    rms, pitch_var = _load_features(wav_path, pitch_method, use_cache)
+    if _is_flat(rms):
+        return []
 
     # 3. heat_index の計算（0–1 正規化後に結合）
     rms_norm  = _normalize(rms)
@@ -73,15 +89,18 @@ def detect_spikes(wav_path: str) -> list[dict]:
     heat      = rms_norm * (1.0 + pvar_norm)
 
     # 4. スパイク候補フレームを抽出
-    threshold     = np.percentile(heat, SPIKE_PERCENTILE)
-    spike_frames  = np.where(heat > threshold)[0]
+    # np.percentile(heat, SPIKE_PERCENTILE, method="lower") と同じ値を全ソートなしで求める
+    k             = int(SPIKE_PERCENTILE / 100 * (len(heat) - 1))
+    threshold     = np.partition(heat, k)[k]
+    mask          = heat > threshold
 
-    if len(spike_frames) == 0:
+    if not mask.any():
         return []
 
-    # フレーム → 秒数に変換
-    spike_times = librosa.frames_to_time(spike_frames, sr=sr, hop_length=HOP_LENGTH)
-    spike_heats = heat[spike_frames]
+    # フレーム → 秒数に変換（フレーム i の時刻は i × HOP_LENGTH / SR）
+    frame_times = np.arange(len(heat)) * (HOP_LENGTH / SR)
+    spike_times = frame_times[mask]
+    spike_heats = heat[mask]
 
     # 5. 隣接スパイクをマージ
     merged = _merge_spikes(spike_times, spike_heats, merge_gap=MERGE_SECONDS)
@@ -89,12 +108,216 @@ def detect_spikes(wav_path: str) -> list[dict]:
     return merged
 
 
+def _load_features(
+    wav_path: str,
+    pitch_method: str,
+    use_cache: bool,
+) -> tuple[np.ndarray, np.ndarray]:
+    """RMS とピッチ分散を返す。キャッシュがあれば音声の読み込みと解析を省略する。"""
+    cache_path = _cache_path(wav_path, pitch_method) if use_cache else None
+    if cache_path is not None and cache_path.exists():
+        with np.load(cache_path) as cached:
+            return cached["rms"], cached["pitch_var"]
+
+    y, sr = _load_audio(wav_path)
+
+    if pitch_method == "centroid":
+        rms, pitch_var = _centroid_features(y, sr)
+    else:
+        rms = _frame_rms(y)
+        if _is_flat(rms):
+            # 無音・ほぼ一定音量ならスパイクは出ないので F0 推定を省略する
+            pitch_var = np.zeros_like(rms)
+        elif pitch_method == "world":
+            pitch_var = _world_pitch_var(y, sr, n_frames=len(rms))
+        else:
+            pitch_var = _pyin_pitch_var(y, sr, n_frames=len(rms))
+
+    if cache_path is not None:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(cache_path, rms=rms, pitch_var=pitch_var)
+    return rms, pitch_var
+
+
+def _load_audio(wav_path: str) -> tuple[np.ndarray, int]:
+    """WAV を soundfile で float32 のまま読み込み、モノラル・SR に揃えて返す。"""
+    y, file_sr = sf.read(wav_path, dtype="float32", always_2d=False)
+    if y.ndim > 1:
+        y = y.mean(axis=1)
+    if file_sr != SR:
+        y = librosa.resample(y, orig_sr=file_sr, target_sr=SR)
+    return y, SR
+
+
+def _cache_path(wav_path: str, pitch_method: str) -> Path:
+    """ファイル内容と解析パラメータから特徴量キャッシュのパスを決める。"""
+    h = hashlib.sha256()
+    h.update(
+        f"{pitch_method}:{SR}:{HOP_LENGTH}:{N_FFT}:{F0_SR}:{F0_FRAME_LENGTH}:{FMIN_HZ}:{FMAX_HZ}".encode()
+    )
+    with open(wav_path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            h.update(chunk)
+    return CACHE_DIR / f"{h.hexdigest()}.npz"
+
+
+def _centroid_features(y: np.ndarray, sr: int) -> tuple[np.ndarray, np.ndarray]:
+    """1 回の STFT から RMS とスペクトル重心の標準偏差（ピッチ分散の代替）を求める。
+
+    librosa.feature.rms(S=S) / spectral_centroid(S=S) と同じ値を、振幅スペクトログラムに
+    対する列ごとの縮約（二乗和・和・周波数の重み付き和）だけで求め、中間配列を作らない。
+    """
+    S     = np.abs(librosa.stft(y, n_fft=N_FFT, hop_length=HOP_LENGTH))
+    freqs = librosa.fft_frequencies(sr=sr, n_fft=N_FFT).astype(S.dtype)
+
+    # RMS（パーセバルの定理。DC とナイキストのビンは片側分のみ数える）
+    sumsq = np.einsum("ft,ft->t", S, S) - 0.5 * (S[0] * S[0] + S[-1] * S[-1])
+    rms   = np.sqrt(2 * np.maximum(sumsq, 0.0) / N_FFT**2)
+
+    # スペクトル重心（無音フレームは 0）
+    mag_sum = S.sum(axis=0)
+    cent    = np.divide(freqs @ S, mag_sum, out=np.zeros_like(mag_sum), where=mag_sum > 0)
+    # 窓幅: ±10フレーム = 約0.23秒
+    return rms, _rolling_std(cent, window=10)
+
+
+def _frame_rms(y: np.ndarray) -> np.ndarray:
+    """librosa.feature.rms(y=y, hop_length=HOP_LENGTH)[0] と同じフレーム RMS を返す。
+
+    中心合わせのゼロパディング後、コピーなしのスライディング窓に対して
+    二乗和を einsum で一括計算する。
+    """
+    padded = np.pad(y, N_FFT // 2)
+    frames = np.lib.stride_tricks.sliding_window_view(padded, N_FFT)[::HOP_LENGTH]
+    return np.sqrt(np.einsum("ij,ij->i", frames, frames) / N_FFT)
+
+
+def _pyin_pitch_var(y: np.ndarray, sr: int, n_frames: int) -> np.ndarray:
+    """pYIN で F0 を推定し、RMS のフレーム時刻に揃えたピッチ分散を返す。"""
+    # F0_SR にダウンサンプリングしてから推定する
+    y_f0    = librosa.resample(y, orig_sr=sr, target_sr=F0_SR)
+    f0_safe = _pyin_f0_parallel(y_f0)
+    # 窓幅: ±10フレーム = 約0.23秒
+    pitch_var = _rolling_std(f0_safe, window=10)
+
+    return _align_frames(pitch_var, F0_HOP_LENGTH / F0_SR, n_frames)
+
+
+def _world_pitch_var(y: np.ndarray, sr: int, n_frames: int) -> np.ndarray:
+    """pyworld の DIO + StoneMask で F0 を推定し、RMS のフレーム時刻に揃えたピッチ分散を返す。
+
+    pyworld はオプション依存（pip install pyworld）。F0 が 0 のフレームは無声区間。
+    """
+    import pyworld as pw
+
+    x = y.astype(np.float64)
+    frame_period = HOP_LENGTH / sr * 1000   # ミリ秒
+    f0, t = pw.dio(x, sr, f0_floor=FMIN_HZ, f0_ceil=FMAX_HZ, frame_period=frame_period)
+    f0    = pw.stonemask(x, f0, t, sr)
+    # 窓幅: ±10フレーム = 約0.23秒
+    pitch_var = _rolling_std(f0, window=10)
+
+    return _align_frames(pitch_var, frame_period / 1000, n_frames)
+
+
+def _align_frames(values: np.ndarray, frame_seconds: float, n_frames: int) -> np.ndarray:
+    """frame_seconds 間隔のフレーム列を、RMS のフレーム時刻（n_frames 個）に線形補間する。"""
+    rms_times = np.arange(n_frames) * (HOP_LENGTH / SR)
+    src_times = np.arange(len(values)) * frame_seconds
+    return np.interp(rms_times, src_times, values).astype(np.float32)
+
+
+def _pyin_f0_parallel(y_f0: np.ndarray) -> np.ndarray:
+    """波形をフレーム境界で分割し、各チャンクの pYIN をプロセス並列で実行する。
+
+    各チャンクの前後に PYIN_OVERLAP_SECONDS ずつ余分に渡して推定し、
+    Viterbi の端の影響を受けるのりしろ部分を捨ててから連結する。
+    """
+    n_frames = 1 + len(y_f0) // F0_HOP_LENGTH
+    n_chunks = min(
+        os.cpu_count() or 1,
+        int(len(y_f0) / F0_SR // PYIN_MIN_CHUNK_SECONDS),
+    )
+    if n_chunks <= 1:
+        return _pyin_chunk(y_f0)
+
+    overlap = int(PYIN_OVERLAP_SECONDS * F0_SR) // F0_HOP_LENGTH   # フレーム数
+    bounds  = np.linspace(0, n_frames, n_chunks + 1).astype(int)
+
+    segments = []
+    trims    = []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        seg_start = max(start - overlap, 0)
+        seg_end   = min(end + overlap, n_frames)
+        segments.append(y_f0[seg_start * F0_HOP_LENGTH: seg_end * F0_HOP_LENGTH])
+        trims.append((start - seg_start, end - seg_start))
+
+    with ProcessPoolExecutor(max_workers=n_chunks) as ex:
+        results = list(ex.map(_pyin_chunk, segments))
+
+    return np.concatenate([f0[lo:hi] for f0, (lo, hi) in zip(results, trims)])
+
+
+def _pyin_chunk(y_chunk: np.ndarray) -> np.ndarray:
+    """pYIN で F0 を推定し、無声区間を 0 に置換して返す（プロセスプールのワーカー）。"""
+    # pyin は無声区間の F0 を NaN で返すので、voiced_flag を使わずに 0 に置換できる
+    f0, _, _ = librosa.pyin(
+        y_chunk,
+        fmin=FMIN_HZ,
+        fmax=FMAX_HZ,
+        sr=F0_SR,
+        frame_length=F0_FRAME_LENGTH,
+        hop_length=F0_HOP_LENGTH,
+    )
+    return np.nan_to_num(f0, copy=False, nan=0.0).astype(np.float32, copy=False)
+
+
+def _is_flat(rms: np.ndarray) -> bool:
+    """RMS がほぼ無音、または変動がほとんどない（スパイクが立たない）場合に True。"""
+    mx = rms.max()
+    return bool(mx < SILENCE_RMS or (mx - rms.min()) / (mx + 1e-12) < FLAT_RMS_RATIO)
+
+
 def _normalize(arr: np.ndarray) -> np.ndarray:
     """0–1 正規化。全値が同一の場合は 0 を返す。"""
     mn, mx = arr.min(), arr.max()
     if mx == mn:
-        return np.zeros_like(arr, dtype=float)
-    return (arr - mn) / (mx - mn)
+        return np.zeros_like(arr, dtype=np.float32)
+    return ((arr - mn) / (mx - mn)).astype(np.float32, copy=False)
+
+
+def _rolling_std(x: np.ndarray, window: int) -> np.ndarray:
+    """各フレーム i について x[max(0, i - window): i + window] の標準偏差を返す。
+
+    累積和から窓内の平均・二乗平均を求めるので O(N)。桁落ちを抑えるため、
+    全体平均を引いてから float64 で累積し、結果だけ float32 で返す。
+    作業配列は事前確保し、累積和・二乗・差分は out= / 複合代入で書き込む。
+    """
+    n = len(x)
+    if n == 0:
+        return np.zeros(0, dtype=np.float32)
+    xc = np.array(x, dtype=np.float64)
+    xc -= xc.mean()
+
+    c1 = np.zeros(n + 1)
+    c2 = np.zeros(n + 1)
+    np.cumsum(xc, out=c1[1:])
+    np.cumsum(np.square(xc, out=xc), out=c2[1:])
+
+    idx = np.arange(n)
+    lo  = np.maximum(idx - window, 0)
+    hi  = np.minimum(idx + window, n)
+    cnt = hi - lo
+
+    m1  = c1[hi]
+    m1 -= c1[lo]
+    m1 /= cnt
+    var  = c2[hi]
+    var -= c2[lo]
+    var /= cnt
+    var -= m1 * m1
+    np.maximum(var, 0.0, out=var)
+    return np.sqrt(var, out=var).astype(np.float32)
 
 
 def _merge_spikes(
@@ -106,21 +329,24 @@ def _merge_spikes(
     if len(times) == 0:
         return []
 
-    groups: list[list[int]] = [[0]]
-    for i in range(1, len(times)):
-        if times[i] - times[groups[-1][-1]] <= merge_gap:
-            groups[-1].append(i)
-        else:
-            groups.append([i])
+    # 直前のスパイクとの間隔が merge_gap を超える位置でグループを区切る
+    breaks   = np.diff(times) > merge_gap
+    starts   = np.concatenate(([0], np.flatnonzero(breaks) + 1))
+    group_id = np.concatenate(([0], np.cumsum(breaks)))
 
-    result = []
-    for group in groups:
-        best_idx = group[np.argmax(heats[group])]
-        result.append({
-            "seconds":   round(float(times[best_idx]), 2),
-            "intensity": round(float(heats[best_idx]), 4),
-        })
-    return result
+    # 各グループで最大強度となる最初のフレームを代表点にする
+    group_max  = np.maximum.reduceat(heats, starts)
+    candidates = np.flatnonzero(heats == group_max[group_id])
+    _, first   = np.unique(group_id[candidates], return_index=True)
+    best       = candidates[first]
+
+    # float64 に揃えてから丸める（float32 のまま丸めると 12.34000015... のような値になる）
+    secs        = np.round(times[best].astype(np.float64), 2)
+    intensities = np.round(heats[best].astype(np.float64), 4)
+    return [
+        {"seconds": s, "intensity": i}
+        for s, i in zip(secs.tolist(), intensities.tolist())
+    ]
 
 
 # ─── CLI エントリポイント ──────────────────────────────────────────────────────
@@ -135,12 +361,27 @@ def parse_args() -> argparse.Namespace:
         help="Output JSON file path (default: stdout)",
         default=None,
     )
+    p.add_argument(
+        "--pitch-method", choices=["centroid", "pyin", "world"], default="centroid",
+        help=(
+            "Pitch-variance source: centroid (spectral centroid, fast), "
+            "pyin (librosa F0) or world (pyworld DIO F0). Default: centroid"
+        ),
+    )
+    p.add_argument(
+        "--no-cache", action="store_true",
+        help="Do not read or write the feature cache (.cache/acoustic/)",
+    )
     return p.parse_args()
 
 
 def main() -> None:
     args   = parse_args()
-    spikes = detect_spikes(args.wav_file)
+    spikes = detect_spikes(
+        args.wav_file,
+        pitch_method=args.pitch_method,
+        use_cache=not args.no_cache,
+    )
 
     output = json.dumps(spikes, ensure_ascii=False, indent=2)
 
@@ -16,7 +16,7 @@ analyze.py — MomentCatcher FR-0 / FR-1
 """
 
 import argparse
-import json
+import functools
 import os
 import re
 import sys
@@ -24,7 +24,9 @@ from datetime import datetime
 from pathlib import Path
 
 import anthropic
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
 
 # ─── 定数 ────────────────────────────────────────────────────────────────────
 
@@ -36,23 +38,44 @@ MAX_TOKENS       = 2048
 # 文字起こしが長すぎる場合のトークン対策（先頭から指定文字数を使用）
 MAX_TRANSCRIPT_CHARS = 15_000
 
+# プロンプトテンプレートのプレースホルダ（例: {transcript_text}）。JSON 例の波括弧には一致しない
+_PLACEHOLDER_RE = re.compile(r"\{(\w+)\}")
+
+# Claude レスポンス中の ```json ... ``` コードブロック
+_JSON_BLOCK_RE = re.compile(r"```json\s*(.*?)\s*```", re.DOTALL)
+
+# Slack Webhook への POST で接続（TLS セッション）を使い回す
+_SLACK_SESSION = requests.Session()
+_SLACK_SESSION.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+
 
 # ─── プロンプト読み込み ────────────────────────────────────────────────────────
 
+@functools.lru_cache(maxsize=4)
+def _read_prompt(path: Path) -> str:
+    return path.read_text(encoding="utf-8")
+
+
+def _fill_prompt(raw: str, values: dict[str, str]) -> str:
+    """{key} 形式のプレースホルダを 1 回の走査でまとめて置換する（未知のキーはそのまま残す）。"""
+    return _PLACEHOLDER_RE.sub(lambda m: values.get(m.group(1), m.group(0)), raw)
+
+
 def load_prompt_fr0(transcript_text: str, file_name: str) -> str:
-    raw = PROMPT_PATH_FR0.read_text(encoding="utf-8")
-    prompt = raw.replace("{transcript_text}", transcript_text)
-    prompt = prompt.replace("{file_name}", file_name)
-    return prompt
+    raw = _read_prompt(PROMPT_PATH_FR0)
+    return _fill_prompt(raw, {
+        "transcript_text": transcript_text,
+        "file_name":       file_name,
+    })
 
 
 def load_prompt_fr1(transcript_text: str, spikes: list, file_name: str) -> str:
-    raw = PROMPT_PATH_FR1.read_text(encoding="utf-8")
-    spikes_str = json.dumps(spikes, ensure_ascii=False)
-    prompt = raw.replace("{transcript_text}", transcript_text)
-    prompt = prompt.replace("{file_name}", file_name)
-    prompt = prompt.replace("{audio_spike_times}", spikes_str)
-    return prompt
+    raw = _read_prompt(PROMPT_PATH_FR1)
+    return _fill_prompt(raw, {
+        "transcript_text":   transcript_text,
+        "file_name":         file_name,
+        "audio_spike_times": orjson.dumps(spikes).decode(),
+    })
 
 
 # ─── Claude API 呼び出し ───────────────────────────────────────────────────────
@@ -68,12 +91,13 @@ def analyze_transcript(prompt: str) -> dict:
 
     # レスポンスから JSON を抽出
     raw_text = message.content[0].text
-    json_match = re.search(r"```json\s*(.*?)\s*```", raw_text, re.DOTALL)
-    if json_match:
-        return json.loads(json_match.group(1))
+    if "```json" in raw_text:
+        json_match = _JSON_BLOCK_RE.search(raw_text)
+        if json_match:
+            return orjson.loads(json_match.group(1))
 
     # コードブロックなしで JSON が返ってきた場合
-    return json.loads(raw_text)
+    return orjson.loads(raw_text)
 
 
 # ─── Slack 通知 ───────────────────────────────────────────────────────────────
@@ -174,7 +198,7 @@ def build_slack_message(result: dict, file_path: str, mode: str = "fr0") -> dict
 
 def send_to_slack(message: dict) -> None:
     webhook_url = os.environ["SLACK_WEBHOOK_URL"]
-    resp = requests.post(
+    resp = _SLACK_SESSION.post(
         webhook_url,
         json=message,
         headers={"Content-Type": "application/json"},
@@ -218,14 +242,14 @@ def main() -> None:
         if not args.spikes:
             print("--mode fr1 には --spikes <json_file> が必要です。", file=sys.stderr)
             sys.exit(1)
-        spikes = json.loads(Path(args.spikes).read_text(encoding="utf-8"))
+        spikes = orjson.loads(Path(args.spikes).read_bytes())
         print(f"スパイク数: {len(spikes)}")
         prompt = load_prompt_fr1(transcript_text[:MAX_TRANSCRIPT_CHARS], spikes, file_name)
     else:
         prompt = load_prompt_fr0(transcript_text[:MAX_TRANSCRIPT_CHARS], file_name)
 
     result = analyze_transcript(prompt)
-    print("Claude 解析完了:", json.dumps(result, ensure_ascii=False, indent=2))
+    print("Claude 解析完了:", orjson.dumps(result, option=orjson.OPT_INDENT_2).decode())
 
     message = build_slack_message(result, file_path, mode=args.mode)
     send_to_slack(message)
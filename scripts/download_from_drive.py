@@ -12,13 +12,18 @@ download_from_drive.py — Google Drive から音声ファイルをダウンロ
 import json
 import os
 import sys
-from pathlib import Path
 
 from google.oauth2.service_account import Credentials
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseDownload
 
 
+# ─── 定数 ────────────────────────────────────────────────────────────────────
+
+DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024   # 1 リクエストあたりの取得サイズ（デフォルトは 100KB）
+WRITE_BUFFER_SIZE   = 1 << 20           # 出力ファイルの書き込みバッファ
+
+
 def main() -> None:
     if len(sys.argv) < 3:
         print("Usage: download_from_drive.py <file_id> <output_path>", file=sys.stderr)
@@ -32,25 +37,21 @@ def main() -> None:
         print("ERROR: GOOGLE_SERVICE_ACCOUNT_KEY is not set", file=sys.stderr)
         sys.exit(1)
 
-    sa_key_path = "/tmp/sa_key.json"
-    Path(sa_key_path).write_text(sa_key_json, encoding="utf-8")
-
-    creds = Credentials.from_service_account_file(
-        sa_key_path,
+    creds = Credentials.from_service_account_info(
+        json.loads(sa_key_json),
         scopes=["https://www.googleapis.com/auth/drive.readonly"],
     )
     service = build("drive", "v3", credentials=creds)
 
     request = service.files().get_media(fileId=file_id)
-    with open(output_path, "wb") as f:
-        downloader = MediaIoBaseDownload(f, request)
+    with open(output_path, "wb", buffering=WRITE_BUFFER_SIZE) as f:
+        downloader = MediaIoBaseDownload(f, request, chunksize=DOWNLOAD_CHUNK_SIZE)
         done = False
         while not done:
             status, done = downloader.next_chunk()
             print(f"Download {int(status.progress() * 100)}%", file=sys.stderr)
 
     print(f"Downloaded to {output_path}", file=sys.stderr)
-    Path(sa_key_path).unlink(missing_ok=True)
 
 
 if __name__ == "__main__":